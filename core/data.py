@@ -7,6 +7,20 @@ import numpy as np
 
 from .event import MarketEvent
 
+
+def expected_rows(bars, default):
+    """
+    Returns the number of rows a portfolio records over a backtest:
+    the start_date row, one per bar and one more for the final
+    MarketEvent the DataHandler emits once it runs out of bars.
+    Falls back to default if the bar count is not known.
+    """
+    n_bars = bars.expected_bar_count()
+    if n_bars is None:
+        return default
+    return n_bars + 2
+
+
 class DataHandler(object):
     """
     DataHandler is an abstract base class providing an interface for
@@ -60,6 +74,21 @@ class DataHandler(object):
         """
         raise NotImplementedError("Should implement get_latest_bars_values()")
 
+    @abstractmethod
+    def get_latest_bars_values_array(self, symbol_list, val_type):
+        """
+        Returns one of the Open, High, Low, Close, Volume or OpenInterest
+        for the last bar of each symbol in symbol_list, as a NumPy array.
+        """
+        raise NotImplementedError("Should implement get_latest_bars_values_array()")
+
+    def expected_bar_count(self):
+        """
+        Returns the number of bars that will be pushed over the
+        whole backtest, or None if it is not known in advance.
+        """
+        return None
+
     @abstractmethod
     def update_bars(self):
         """
@@ -133,6 +162,8 @@ class HistoricCSVDataHandler(DataHandler):
             # Set the latest symbol_data to None
             self.latest_symbol_data[s] = []
 
+        self._bar_count = len(comb_index)
+
         # Reindex the dataframes
         for s in self.symbol_list:
             # 重新 index
@@ -219,6 +250,29 @@ class HistoricCSVDataHandler(DataHandler):
         else:
             return np.array([getattr(b[1], val_type) for b in bars_list])
 
+    def get_latest_bars_values_array(self, symbol_list, val_type):
+        """
+        Returns one of the Open, High, Low, Close, Volume or OpenInterest
+        for the last bar of every symbol in symbol_list, as a float array
+        in the same order as symbol_list.
+        """
+        try:
+            bars_lists = [self.latest_symbol_data[s] for s in symbol_list]
+        except KeyError:
+            print("That symbol is not available in the historical data set.")
+            raise
+        else:
+            return np.fromiter(
+                (getattr(b[-1][1], val_type) for b in bars_lists),
+                dtype=np.float64, count=len(bars_lists)
+            )
+
+    def expected_bar_count(self):
+        """
+        Returns the number of bars the handler pushes over the
+        whole backtest, i.e. the length of the combined index.
+        """
+        return self._bar_count
 
     def update_bars(self):
         """
@@ -1,6 +1,14 @@
 import uuid
 
 
+# Sign of a fill on the position, keyed by fill direction
+_DIR_SIGN = {'BUY': 1, 'SELL': -1}
+
+# Integer codes of the signal types, keyed by signal type
+LONG, SHORT, EXIT = 1, 2, 3
+_SIGNAL_TYPE_CODE = {'LONG': LONG, 'SHORT': SHORT, 'EXIT': EXIT}
+
+
 class Event(object):
   """
   Event is base class providing an interface for all subsequent
@@ -60,6 +68,7 @@ class SignalEvent(Event):
         self.symbol = symbol
         self.datetime = datetime
         self.signal_type = signal_type
+        self.signal_type_code = _SIGNAL_TYPE_CODE[signal_type]
         self.quantity = quantity
         self.stop_loss = stop_loss
         self.profit_target = profit_target
@@ -151,6 +160,7 @@ class FillEvent(Event):
         self.exchange = exchange
         self.quantity = quantity
         self.direction = direction
+        self.dir_sign = _DIR_SIGN[direction]
 
         # Calculate commission
         if commission is None:
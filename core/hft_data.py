@@ -70,6 +70,8 @@ class HistoricCSVDataHandlerHFT(DataHandler):
             # Set the latest symbol_data to None
             self.latest_symbol_data[s] = []
 
+        self._bar_count = len(comb_index)
+
         # Reindex the dataframes
         for s in self.symbol_list:
             # 重新 index
@@ -155,6 +157,29 @@ class HistoricCSVDataHandlerHFT(DataHandler):
         else:
             return np.array([getattr(b[1], val_type) for b in bars_list])
 
+    def get_latest_bars_values_array(self, symbol_list, val_type):
+        """
+        Returns one of the Open, High, Low, Close, Volume or OpenInterest
+        for the last bar of every symbol in symbol_list, as a float array
+        in the same order as symbol_list.
+        """
+        try:
+            bars_lists = [self.latest_symbol_data[s] for s in symbol_list]
+        except KeyError:
+            print("That symbol is not available in the historical data set.")
+            raise
+        else:
+            return np.fromiter(
+                (getattr(b[-1][1], val_type) for b in bars_lists),
+                dtype=np.float64, count=len(bars_lists)
+            )
+
+    def expected_bar_count(self):
+        """
+        Returns the number of bars the handler pushes over the
+        whole backtest, i.e. the length of the combined index.
+        """
+        return self._bar_count
 
     def update_bars(self):
         """
@@ -6,6 +6,7 @@ import queue
 from abc import ABCMeta, abstractmethod
 from math import floor
 
+from .data import expected_rows
 from .event import FillEvent, OrderEvent
 from .performance import create_sharpe_ratio, create_drawdowns
 from .portfolio import Portfolio
@@ -19,7 +20,8 @@ class PortfolioHFT(Portfolio):
     used to test simpler strategies such as BuyAndHoldStrategy.
     """
 
-    def __init__(self, bars, events, start_date, initial_capital=100000.0):
+    def __init__(self, bars, events, start_date, initial_capital=100000.0,
+                 verbose=False):
         """
         Initialises the portfolio with bars and an event queue.
         Also includes a starting datetime index and initial capital
@@ -30,22 +32,21 @@ class PortfolioHFT(Portfolio):
         events - The Event Queue object.
         start_date - The start date (bar) of the portfolio.
         initial_capital - The starting capital in USD.
+        verbose - Whether to print debug output.
         """
         self.bars = bars
         self.events = events
         self.symbol_list = self.bars.symbol_list
         self.start_date = start_date
         self.initial_capital = initial_capital
+        self.verbose = verbose
 
+        self._bar_i = 1
         self.all_positions = self.construct_all_positions()
-        self.current_positions = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
-        print(self.current_positions)
-        print(self.all_positions)
+        self.current_positions = dict.fromkeys(self.symbol_list, 0)
 
         self.all_holdings = self.construct_all_holdings()
         self.current_holdings = self.construct_current_holdings()
-        print(self.current_holdings)
-        print(self.all_holdings)
 
     def construct_all_positions(self):
         """
@@ -54,28 +55,32 @@ class PortfolioHFT(Portfolio):
         """
         #  simply creates a dictionary for each symbol, sets the value to zero
         #  for each and then adds a datetime key, finally adding it to a list
-        d = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
+        d = dict.fromkeys(self.symbol_list, 0)
         d['datetime'] = self.start_date
-        return [d]
+        positions = [None] * expected_rows(self.bars, 1)
+        positions[0] = d
+        return positions
 
     def construct_all_holdings(self):
         """
         Constructs the holdings list using the start_date
         to determine when the time index will begin.
         """
-        d = dict( (k,v) for k, v in [(s, 0.0) for s in self.symbol_list] )
+        d = dict.fromkeys(self.symbol_list, 0.0)
         d['datetime'] = self.start_date
         d['cash'] = self.initial_capital
         d['commission'] = 0.0
         d['total'] = self.initial_capital
-        return [d]
+        holdings = [None] * expected_rows(self.bars, 1)
+        holdings[0] = d
+        return holdings
 
     def construct_current_holdings(self):
         """
         This constructs the dictionary which will hold the instantaneous
         value of the portfolio across all symbols.
         """
-        d = dict( (k,v) for k, v in [(s, 0.0) for s in self.symbol_list] )
+        d = dict.fromkeys(self.symbol_list, 0.0)
         d['cash'] = self.initial_capital
         d['commission'] = 0.0
         d['total'] = self.initial_capital
@@ -96,18 +101,18 @@ class PortfolioHFT(Portfolio):
 
         # Update positions
         # ===============
-        dp = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
+        dp = dict.fromkeys(self.symbol_list, 0)
         dp['datetime'] = latest_datetime
 
         for s in self.symbol_list:
             dp[s] = self.current_positions[s]
 
-        # Append the current positions
-        self.all_positions.append(dp)
+        # Store the current positions
+        self._store_row(self.all_positions, dp)
 
         # Update holdings
         # ===============
-        dh = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
+        dh = dict.fromkeys(self.symbol_list, 0)
         dh['datetime'] = latest_datetime
         dh['cash'] = self.current_holdings['cash']
         dh['commission'] = self.current_holdings['commission']
@@ -122,8 +127,19 @@ class PortfolioHFT(Portfolio):
             dh[s] = market_value
             dh['total'] += market_value
 
-        # Append the current holdings
-        self.all_holdings.append(dh)
+        # Store the current holdings
+        self._store_row(self.all_holdings, dh)
+        self._bar_i += 1
+
+    def _store_row(self, rows, d):
+        """
+        Stores d at the current bar of the preallocated rows list,
+        appending once the list is full.
+        """
+        if self._bar_i < len(rows):
+            rows[self._bar_i] = d
+        else:
+            rows.append(d)
 
     def update_positions_from_fill(self, fill):
         """
@@ -133,15 +149,8 @@ class PortfolioHFT(Portfolio):
         Parameters:
         fill - The FillEvent object to update the positions with.
         """
-        # Check whether the fill is a buy or sell
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
-
         # Update positions list with new quantities
-        self.current_positions[fill.symbol] += fill_dir*fill.quantity
+        self.current_positions[fill.symbol] += fill.dir_sign*fill.quantity
 
     def update_holdings_from_fill(self, fill):
         """
@@ -151,18 +160,11 @@ class PortfolioHFT(Portfolio):
         Parameters:
         fill - The FillEvent object to update the holdings with.
         """
-        # Check whether the fill is a buy or sell
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
-
         # Update holdings list with new quantities
         # This is estimated cause we do NOT know the cost of fill
         # in a simulated environment. (there are slippery etc in real.)
         fill_cost = self.bars.get_latest_bar_value(fill.symbol, "close")
-        cost = fill_dir * fill_cost * fill.quantity
+        cost = fill.dir_sign * fill_cost * fill.quantity
         self.current_holdings[fill.symbol] += cost
         self.current_holdings['commission'] += fill.commission
         self.current_holdings['cash'] -= (cost + fill.commission)
@@ -222,7 +224,7 @@ class PortfolioHFT(Portfolio):
         Creates a pandas DataFrame from the all_holdings
         list of dictionaries.
         """
-        curve = pd.DataFrame(self.all_holdings)
+        curve = pd.DataFrame(self.all_holdings[:self._bar_i])
         curve.set_index('datetime', inplace=True)
         curve['returns'] = curve['total'].pct_change()
         curve['equity_curve'] = (1.0+curve['returns']).cumprod()
@@ -233,8 +235,11 @@ class PortfolioHFT(Portfolio):
         Creates a pandas DataFrame from the all_positions
         list of dictionaries.
         """
-        trade = pd.DataFrame(self.all_positions)
-        trade.set_index('datetime', inplace=True)
+        trade = pd.DataFrame.from_records(
+            self.all_positions[:self._bar_i],
+            columns=['datetime'] + self.symbol_list,
+            index='datetime'
+        )
         self.trade_history = trade
 
     def output_summary_stats(self):
@@ -254,10 +259,11 @@ class PortfolioHFT(Portfolio):
                  ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
                  ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
                  ("Drawdown Duration", "%d" % dd_duration)]
-        print('======')
-        print(self.current_holdings)
-        print(self.current_positions)
-        print('======')
+        if self.verbose:
+            print('======')
+            print(self.current_holdings)
+            print(self.current_positions)
+            print('======')
         self.equity_curve.to_csv('equity.csv')
         self.trade_history.to_csv('all_positions.csv')
         return stats
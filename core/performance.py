@@ -7,36 +7,40 @@ def create_sharpe_ratio(returns, periods=252):
     benchmark of zero (i.e. no risk-free rate information).
 
     Parameters:
-    returns - A pandas Series representing period percentage returns.
+    returns - A pandas Series or NumPy array representing period
+              percentage returns. NaN returns are ignored.
     periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
     """
-    return np.sqrt(periods) * (np.mean(returns)) / np.std(returns)
+    returns = np.asarray(returns, dtype=np.float64)
+    return np.sqrt(periods) * np.nanmean(returns) / np.nanstd(returns)
 
 def create_drawdowns(equity_curve):
     """
     Calculate the largest peak-to-trough drawdown of the PnL curve
-    as well as the duration of the drawdown. Requires that the
-    pnl_returns is a pandas Series.
+    as well as the duration of the drawdown. The first value of the
+    curve is skipped, as it has no return yet.
 
     Parameters:
-    pnl - A pandas Series representing period percentage returns.
+    equity_curve - A pandas Series or NumPy array representing the
+                   cumulative returns curve.
 
     Returns:
-    drawdown, duration - Highest peak-to-trough drawdown and duration.
+    drawdown, max_dd, duration - The drawdown array, the highest
+    peak-to-trough drawdown and the longest drawdown duration.
     """
+    eq = np.asarray(equity_curve, dtype=np.float64)
+    n = eq.size
+    drawdown = np.full(n, np.nan)
+    duration = np.full(n, np.nan)
+    if n < 2:
+        return drawdown, np.nan, np.nan
 
-    # Calculate the cumulative returns curve
-    # and set up the High Water Mark
-    # Then create the drawdown and duration series
-    hwm = [0]
-    eq_idx = equity_curve.index
-    drawdown = pd.Series(index = eq_idx)
-    duration = pd.Series(index = eq_idx)
+    # High Water Mark, starting from zero
+    hwm = np.maximum.accumulate(np.maximum(eq[1:], 0.0))
+    drawdown[1:] = hwm - eq[1:]
 
-    # Loop over the index range
-    for t in range(1, len(eq_idx)):
-        cur_hwm = max(hwm[t-1], equity_curve[t])
-        hwm.append(cur_hwm)
-        drawdown[t]= hwm[t] - equity_curve[t]
-        duration[t]= 0 if drawdown[t] == 0 else duration[t-1] + 1
-    return drawdown, drawdown.max(), duration.max()
+    # Bars since the last time the curve was at its High Water Mark
+    t = np.arange(1, n)
+    last_peak = np.maximum.accumulate(np.where(drawdown[1:] == 0, t, 0))
+    duration[1:] = t - last_peak
+    return drawdown, np.nanmax(drawdown), np.nanmax(duration)
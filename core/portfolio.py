@@ -4,13 +4,22 @@ import datetime
 import numpy as np
 import pandas as pd
 import queue
-import copy
 
 from abc import ABCMeta, abstractmethod
 from math import floor
 
-from .event import FillEvent, OrderEvent
-from .performance import create_sharpe_ratio, create_drawdowns
+from .data import expected_rows
+from .event import FillEvent, OrderEvent, LONG, SHORT
+from .performance import create_sharpe_ratio
+try:
+    # Ahead-of-time compiled kernels, see portfolio_kernels.py
+    from ._portfolio_kernels import (apply_fill, apply_fills,
+                                     update_timeindex_kernel,
+                                     equity_curve_kernel)
+except ImportError:
+    from .portfolio_kernels import (apply_fill, apply_fills,
+                                    update_timeindex_kernel,
+                                    equity_curve_kernel)
 
 
 class Portfolio(object):
@@ -45,8 +54,23 @@ class NaivePortfolio(Portfolio):
     a brokerage object with a constant quantity size blindly,
     i.e. without any risk management or position sizing. It is
     used to test simpler strategies such as BuyAndHoldStrategy.
+
+    Positions and holdings are kept as preallocated NumPy arrays
+    (one row per bar) rather than lists of dictionaries.
     """
 
+    # Number of bars preallocated when the DataHandler cannot tell
+    # how many bars it will push
+    _INITIAL_BARS = 1024
+
+    # Columns of the order and fill histories
+    _ORDER_FIELDS = ('type', 'order_id', 'direction', 'quantity', 'symbol',
+                     'order_type', 'stop_loss', 'profit_target', 'limit_price',
+                     'stop_price', 'entry_price', 'exit_price', 'entry_time',
+                     'exit_time', 'profit')
+    _FILL_FIELDS = ('type', 'fill_id', 'order', 'timeindex', 'price', 'symbol',
+                    'exchange', 'quantity', 'direction', 'commission')
+
     def __init__(self, bars, events, start_date, initial_capital=100000.0):
         """
         Initialises the portfolio with bars and an event queue.
@@ -65,53 +89,110 @@ class NaivePortfolio(Portfolio):
         self.start_date = start_date
         self.initial_capital = initial_capital
 
-        self.all_positions = self.construct_all_positions()
-        self.current_positions = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
-        print(self.current_positions)
-        print(self.all_positions)
+        self.symbol_to_idx = dict((s, i) for i, s in enumerate(self.symbol_list))
+
+        self.construct_all_positions()
+        self._cur_pos = np.zeros(len(self.symbol_list), dtype=np.int64)
 
-        self.all_holdings = self.construct_all_holdings()
-        self.current_holdings = self.construct_current_holdings()
-        print(self.current_holdings)
-        print(self.all_holdings)
+        self.construct_all_holdings()
+        self.construct_current_holdings()
 
-        self.all_orders = {}
-        self.all_fills = []
+        self.all_orders = []
+        self._seen_order_ids = set()
+        self.all_fills = dict((f, []) for f in self._FILL_FIELDS)
 
     def construct_all_positions(self):
         """
-        Constructs the positions list using the start_date
+        Allocates the per-bar positions matrix, one row per bar and
+        one column per symbol, with the first row set at start_date
         to determine when the time index will begin.
         """
-        #  simply creates a dictionary for each symbol, sets the value to zero
-        #  for each and then adds a datetime key, finally adding it to a list
-        d = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
-        d['datetime'] = self.start_date
-        return [d]
+        n_bars = expected_rows(self.bars, self._INITIAL_BARS)
+        self._dt = np.empty(n_bars, dtype=object)
+        self._dt[0] = self.start_date
+        self._pos = np.zeros((n_bars, len(self.symbol_list)), dtype=np.int64)
+        self._i = 1
 
     def construct_all_holdings(self):
         """
-        Constructs the holdings list using the start_date
-        to determine when the time index will begin.
+        Allocates the per-bar holdings arrays (market value per symbol,
+        cash, commission and total), with the first row set at start_date.
         """
-        d = dict( (k,v) for k, v in [(s, 0.0) for s in self.symbol_list] )
-        d['datetime'] = self.start_date
-        d['cash'] = self.initial_capital
-        d['commission'] = 0.0
-        d['total'] = self.initial_capital
-        return [d]
+        n_bars = len(self._dt)
+        self._mv = np.zeros((n_bars, len(self.symbol_list)))
+        self._cash = np.zeros(n_bars)
+        self._commission = np.zeros(n_bars)
+        self._total = np.zeros(n_bars)
+        self._cash[0] = self.initial_capital
+        self._total[0] = self.initial_capital
 
     def construct_current_holdings(self):
         """
-        This constructs the dictionary which will hold the instantaneous
+        This constructs the arrays which will hold the instantaneous
         value of the portfolio across all symbols.
         """
-        d = dict( (k,v) for k, v in [(s, 0.0) for s in self.symbol_list] )
-        d['cash'] = self.initial_capital
-        d['commission'] = 0.0
-        d['total'] = self.initial_capital
+        self._cur_holdings = np.zeros(len(self.symbol_list))
+        # [cash, commission], kept as an array so the kernels update it
+        # in place
+        self._cur_acc = np.array([self.initial_capital, 0.0])
+
+    def _grow_buffers(self):
+        """
+        Doubles the capacity of the per-bar arrays once the
+        backtest runs past the number of preallocated bars.
+        """
+        n_bars = 2 * len(self._dt)
+        for name in ('_dt', '_pos', '_mv', '_cash', '_commission', '_total'):
+            old = getattr(self, name)
+            new = np.zeros((n_bars,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    @property
+    def all_positions(self):
+        """
+        The positions matrix as a list of dictionaries, one per bar.
+        """
+        return [
+            dict(zip(self.symbol_list, row.tolist()), datetime=dt)
+            for dt, row in zip(self._dt[:self._i], self._pos[:self._i])
+        ]
+
+    @property
+    def current_positions(self):
+        """
+        The current positions as a {symbol: quantity} dictionary.
+        """
+        return dict(zip(self.symbol_list, self._cur_pos.tolist()))
+
+    @property
+    def current_holdings(self):
+        """
+        The current holdings as a dictionary of the cost of each symbol,
+        plus cash, commission and total. As before, total only moves with
+        fills, so it equals cash until update_timeindex marks to market.
+        """
+        d = dict(zip(self.symbol_list, self._cur_holdings.tolist()))
+        d['cash'] = float(self._cur_acc[0])
+        d['commission'] = float(self._cur_acc[1])
+        d['total'] = float(self._cur_acc[0])
         return d
 
+    @property
+    def all_holdings(self):
+        """
+        The holdings matrix as a list of dictionaries, one per bar.
+        """
+        holdings = []
+        for i in range(self._i):
+            d = dict(zip(self.symbol_list, self._mv[i].tolist()))
+            d['datetime'] = self._dt[i]
+            d['cash'] = self._cash[i]
+            d['commission'] = self._commission[i]
+            d['total'] = self._total[i]
+            holdings.append(d)
+        return holdings
+
     def update_timeindex(self, event):
         """
         Adds a new record to the positions matrix for the current
@@ -124,84 +205,75 @@ class NaivePortfolio(Portfolio):
         latest_datetime = self.bars.get_latest_bar_datetime(
             self.symbol_list[0]
         )
+        if self._i == len(self._dt):
+            self._grow_buffers()
+        i = self._i
 
-        # Update positions
-        # ===============
-        dp = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
-        dp['datetime'] = latest_datetime
-
-        for s in self.symbol_list:
-            dp[s] = self.current_positions[s]
-
-        # Append the current positions
-        self.all_positions.append(dp)
-
-        # Update holdings
+        # Update positions and holdings
         # ===============
-        dh = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
-        dh['datetime'] = latest_datetime
-        dh['cash'] = self.current_holdings['cash']
-        dh['commission'] = self.current_holdings['commission']
-        dh['total'] = self.current_holdings['cash']
-
-        for s in self.symbol_list:
-            # Approximation to the real value, [5] = close price
-            # print(s)
-            # print(bars[s][0][1].values[4])
-            market_value = self.current_positions[s] * \
-                self.bars.get_latest_bar_value(s, "close")
-            dh[s] = market_value
-            dh['total'] += market_value
+        # Approximation to the real value, using the latest close price
+        self._dt[i] = latest_datetime
+        closes = self.bars.get_latest_bars_values_array(
+            self.symbol_list, "close"
+        )
+        update_timeindex_kernel(
+            i, closes, self._cur_pos, self._cur_acc, self._pos, self._mv,
+            self._cash, self._commission, self._total
+        )
 
-        # Append the current holdings
-        self.all_holdings.append(dh)
+        self._i += 1
 
-    def update_positions_from_fill(self, fill):
+    def update_positions_and_holdings_from_fill(self, fill):
         """
-        Takes a FilltEvent object and updates the position matrix
-        to reflect the new position.
+        Takes a FillEvent object and updates the position matrix
+        and holdings value to reflect the new position.
 
         Parameters:
-        fill - The FillEvent object to update the positions with.
+        fill - The FillEvent object to update the portfolio with.
         """
-        # Check whether the fill is a buy or sell
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
-
-        # Update positions list with new quantities
-        self.current_positions[fill.symbol] += fill_dir*fill.quantity
+        # Update holdings with new quantities
+        # This is estimated cause we do NOT know the cost of fill
+        # in a simulated environment. (there are slippery etc in real.)
+        fill_cost = self.bars.get_latest_bar_value(fill.symbol, "close")
+        apply_fill(
+            self._cur_pos, self._cur_holdings, self._cur_acc,
+            self.symbol_to_idx[fill.symbol], fill.dir_sign,
+            fill.quantity, fill_cost, fill.commission
+        )
 
-    def update_holdings_from_fill(self, fill):
+    def update_orders_from_fill(self, fill):
         """
-        Takes a FillEvent object and updates the holdings matrix
-        to reflect the holdings value.
+        Records the order of a FillEvent in all_orders, once per order.
+        An order is filled again on exit, and the entry already refers
+        to the same (updated) OrderEvent object.
 
         Parameters:
-        fill - The FillEvent object to update the holdings with.
+        fill - The FillEvent object whose order is recorded.
         """
-        # Check whether the fill is a buy or sell
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
+        order = fill.order
+        if order.order_id not in self._seen_order_ids:
+            self._seen_order_ids.add(order.order_id)
+            self.all_orders.append(order)
 
-        # Update holdings list with new quantities
-        # This is estimated cause we do NOT know the cost of fill
-        # in a simulated environment. (there are slippery etc in real.)
-        fill_cost = self.bars.get_latest_bar_value(fill.symbol, "close")
-        cost = fill_dir * fill_cost * fill.quantity
-        self.current_holdings[fill.symbol] += cost
-        self.current_holdings['commission'] += fill.commission
-        self.current_holdings['cash'] -= (cost + fill.commission)
-        self.current_holdings['total'] -= (cost + fill.commission)
+    def update_fill_history_from_fill(self, fill):
+        """
+        Appends the fields of a FillEvent to the all_fills columns,
+        storing the order by its order_id.
 
-    def update_orders_from_fill(self, fill):
-        order = fill.order
-        self.all_orders[order.order_id] = order
+        Parameters:
+        fill - The FillEvent object to record.
+        """
+        cols = self.all_fills
+        cols['type'].append(fill.type)
+        cols['fill_id'].append(fill.fill_id)
+        cols['order'].append(fill.order.order_id)
+        cols['timeindex'].append(fill.timeindex)
+        cols['price'].append(fill.price)
+        cols['symbol'].append(fill.symbol)
+        cols['exchange'].append(fill.exchange)
+        cols['quantity'].append(fill.quantity)
+        cols['direction'].append(fill.direction)
+        cols['commission'].append(fill.commission)
 
     def update_fill(self, event):
         """
@@ -209,20 +281,39 @@ class NaivePortfolio(Portfolio):
         from a FillEvent.
         """
         if event.type == 'FILL':
-            self.update_positions_from_fill(event)
-            self.update_holdings_from_fill(event)
+            self.update_positions_and_holdings_from_fill(event)
             self.update_orders_from_fill(event)
-            fill = vars(event)
-            fill['order'] = event.order.order_id
-            self.all_fills.append(fill)
+            self.update_fill_history_from_fill(event)
 
     def update_fills(self, events):
         """
         Updates the portfolio current positions and holdings
         from a list of FillEvent.
-        """
-        for event in events:
-            self.update_fill(event)
+
+        The fills are gathered into one array per field and applied
+        to the positions and holdings in a single kernel call.
+        """
+        fills = [e for e in events if e.type == 'FILL']
+        n = len(fills)
+        sym_idx = np.fromiter((self.symbol_to_idx[f.symbol] for f in fills),
+                              dtype=np.int64, count=n)
+        dir_signs = np.fromiter((f.dir_sign for f in fills),
+                                dtype=np.int64, count=n)
+        qtys = np.fromiter((f.quantity for f in fills),
+                           dtype=np.int64, count=n)
+        comms = np.fromiter((f.commission for f in fills),
+                            dtype=np.float64, count=n)
+        # Same estimate of the fill cost as update_fill, i.e. the latest close
+        prices = self.bars.get_latest_bars_values_array(
+            self.symbol_list, "close"
+        )[sym_idx]
+        apply_fills(
+            self._cur_pos, self._cur_holdings, self._cur_acc,
+            sym_idx, dir_signs, qtys, prices, comms
+        )
+        for fill in fills:
+            self.update_orders_from_fill(fill)
+            self.update_fill_history_from_fill(fill)
 
     def generate_naive_order(self, signal):
         """
@@ -233,25 +324,22 @@ class NaivePortfolio(Portfolio):
         Parameters:
         signal - The SignalEvent signal information.
         """
-        order = None
+        signal_type = signal.signal_type_code
+        cur_quantity = int(self._cur_pos[self.symbol_to_idx[signal.symbol]])
 
-        direction = signal.signal_type
-
-        cur_quantity = self.current_positions[signal.symbol]
-
-        if direction == 'LONG':
+        if signal_type == LONG:
             # 新的多单
-            order = OrderEvent(signal, signal.quantity, 'BUY')
-        if direction == 'SHORT':
+            direction, quantity = 'BUY', signal.quantity
+        elif signal_type == SHORT:
             # 新的空单
-            order = OrderEvent(signal, signal.quantity, 'SELL')
-
-        # EXIT 表示清空当前的多单或者空单
-        if direction == 'EXIT' and cur_quantity > 0:
-            order = OrderEvent(signal, abs(cur_quantity), 'SELL')
-        if direction == 'EXIT' and cur_quantity < 0:
-            order = OrderEvent(signal, abs(cur_quantity), 'BUY')
-        return order
+            direction, quantity = 'SELL', signal.quantity
+        else:
+            # EXIT 表示清空当前的多单或者空单
+            if cur_quantity == 0:
+                return None
+            direction = 'SELL' if cur_quantity > 0 else 'BUY'
+            quantity = abs(cur_quantity)
+        return OrderEvent(signal, quantity, direction)
 
     def update_signal(self, event):
         """
@@ -260,35 +348,54 @@ class NaivePortfolio(Portfolio):
         """
         if event.type == 'SIGNAL':
             order_event = self.generate_naive_order(event)
-            self.events.put(order_event)
+            if order_event is not None:
+                self.events.put(order_event)
 
     def create_equity_curve_dataframe(self):
         """
-        Creates a pandas DataFrame from the all_holdings
-        list of dictionaries.
-        """
-        curve = pd.DataFrame(self.all_holdings)
-        curve.set_index('datetime', inplace=True)
-        curve['returns'] = curve['total'].pct_change()
-        curve['equity_curve'] = (1.0+curve['returns']).cumprod()
+        Creates a pandas DataFrame from the holdings arrays.
+        """
+        n = self._i
+        total = self._total[:n]
+        returns = np.empty(n)
+        equity = np.empty(n)
+        drawdown = np.empty(n)
+        dd_stats = np.empty(2)
+        equity_curve_kernel(total, returns, equity, drawdown, dd_stats)
+        self.max_drawdown, self.drawdown_duration = dd_stats
+
+        curve = pd.DataFrame(self._mv[:n], columns=self.symbol_list,
+                             index=pd.Index(self._dt[:n], name='datetime'))
+        curve['cash'] = self._cash[:n]
+        curve['commission'] = self._commission[:n]
+        curve['total'] = total
+        curve['returns'] = returns
+        curve['equity_curve'] = equity
+        curve['drawdown'] = drawdown
+        self._returns = returns
         self.equity_curve = curve
 
     def create_trade_history_dataframe(self):
         """
-        Creates a pandas DataFrame from the all_positions
-        list of dictionaries.
+        Creates a pandas DataFrame from the positions matrix.
         """
-        print(self.all_positions)
-        trade = pd.DataFrame(self.all_positions)
-        trade.set_index('datetime', inplace=True)
+        n = self._i
+        trade = pd.DataFrame(self._pos[:n], columns=self.symbol_list,
+                             index=pd.Index(self._dt[:n], name='datetime'),
+                             dtype=np.int64)
         self.trade_history = trade
 
     def create_order_history_dataframe(self):
         """
-        Creates a pandas DataFrame from the all_positions
-        list of dictionaries.
+        Creates a pandas DataFrame from the all_orders, one column
+        per order field.
         """
-        orders = pd.DataFrame([vars(c) for c in self.all_orders.values()])
+        # Orders keep changing after they are filled (exit price, profit),
+        # so the columns are read from the orders at the end of the run.
+        orders = pd.DataFrame(dict(
+            (f, [getattr(o, f) for o in self.all_orders])
+            for f in self._ORDER_FIELDS
+        ), columns=list(self._ORDER_FIELDS))
         self.order_history = orders
 
     def output_summary_stats(self):
@@ -296,22 +403,21 @@ class NaivePortfolio(Portfolio):
         Creates a list of summary statistics for the portfolio such
         as Sharpe Ratio and drawdown information.
         """
-        total_return = self.equity_curve['equity_curve'][-1]
-        returns = self.equity_curve['returns']
-        pnl = self.equity_curve['equity_curve']
-
-        sharpe_ratio = create_sharpe_ratio(returns, periods=252*6)
-        drawdown, max_dd, dd_duration = create_drawdowns(pnl)
-        self.equity_curve['drawdown'] = drawdown
-
-        profit = self.order_history['profit'].sum()
-        profit = round(profit, 1)
-        total_profit = sum(self.order_history[self.order_history['profit'] > 0].profit)
+        sharpe_ratio = create_sharpe_ratio(self._returns, periods=252*6)
+        max_dd = self.max_drawdown
+        dd_duration = self.drawdown_duration
+
+        # Orders still open have no profit yet and are read as NaN,
+        # which compares False against both masks below.
+        p = self.order_history['profit'].to_numpy(dtype=np.float64)
+        win = p > 0
+        total_profit = p[win].sum()
+        total_loss = p[p < 0].sum()
+        profit = round(total_profit + total_loss, 1)
         total_profit = round(total_profit, 1)
-        total_loss = sum(self.order_history[self.order_history['profit'] < 0].profit)
         total_loss = round(total_loss, 1)
-        trade_no = len(self.order_history)
-        winrate = round(len(self.order_history[self.order_history['profit'] > 0])/trade_no, 3)
+        trade_no = p.size
+        winrate = round(np.count_nonzero(win)/trade_no, 3)
 
         stats = [("Profit", "{} pips.".format(profit)),
                  ("Annualized Sharpe Ratio", "%0.1f" % sharpe_ratio),
@@ -0,0 +1,151 @@
+"""
+Numerical kernels behind NaivePortfolio's per-bar and per-fill updates.
+
+The kernels are JIT-compiled with Numba on import. They can also be
+compiled ahead of time into the _portfolio_kernels extension module,
+which NaivePortfolio imports in preference to this module, so that a
+backtest runs without any JIT compilation:
+
+    python -m core.portfolio_kernels
+"""
+import os
+
+import numpy as np
+from numba import njit
+
+
+APPLY_FILL_SIG = 'void(i8[:], f8[:], f8[:], i8, i8, i8, f8, f8)'
+APPLY_FILLS_SIG = \
+    'void(i8[:], f8[:], f8[:], i8[:], i8[:], i8[:], f8[:], f8[:])'
+UPDATE_TIMEINDEX_SIG = \
+    'void(i8, f8[:], i8[:], f8[:], i8[:,:], f8[:,:], f8[:], f8[:], f8[:])'
+EQUITY_CURVE_SIG = 'void(f8[:], f8[:], f8[:], f8[:], f8[:])'
+
+
+@njit(APPLY_FILL_SIG, cache=True)
+def apply_fill(cur_pos, holdings, acc, sym_idx, dir_sign, qty, price, comm):
+    """
+    Applies a single fill to the current positions and holdings in place.
+
+    Parameters:
+    cur_pos - The int64 positions vector, one entry per symbol.
+    holdings - The float64 holdings vector, one entry per symbol.
+    acc - The float64 [cash, commission] accumulator.
+    sym_idx - The index of the filled symbol.
+    dir_sign - +1 for 'BUY', -1 for 'SELL'.
+    qty - The filled quantity.
+    price - The price used to value the fill.
+    comm - The commission of the fill.
+    """
+    cost = dir_sign * price * qty
+    cur_pos[sym_idx] += dir_sign * qty
+    holdings[sym_idx] += cost
+    acc[0] -= cost + comm
+    acc[1] += comm
+
+
+@njit(APPLY_FILLS_SIG, cache=True)
+def apply_fills(cur_pos, holdings, acc, sym_idx, dir_signs, qtys, prices,
+                comms):
+    """
+    Applies a batch of fills, given as one array per fill field, to the
+    current positions and holdings in place. Same as calling apply_fill
+    once per fill, in order.
+    """
+    cash = acc[0]
+    comm_acc = acc[1]
+    for k in range(dir_signs.size):
+        i = sym_idx[k]
+        d = dir_signs[k]
+        cost = d * prices[k] * qtys[k]
+        cur_pos[i] += d * qtys[k]
+        holdings[i] += cost
+        cash -= cost + comms[k]
+        comm_acc += comms[k]
+    acc[0] = cash
+    acc[1] = comm_acc
+
+
+@njit(UPDATE_TIMEINDEX_SIG, cache=True)
+def update_timeindex_kernel(i, closes, cur_pos, acc, pos, mv, cash,
+                            commission, total):
+    """
+    Writes row i of the per-bar positions and holdings arrays from the
+    current positions, the [cash, commission] accumulator and the
+    latest close of every symbol.
+    """
+    t = acc[0]
+    for k in range(closes.size):
+        v = cur_pos[k] * closes[k]
+        pos[i, k] = cur_pos[k]
+        mv[i, k] = v
+        t += v
+    cash[i] = acc[0]
+    commission[i] = acc[1]
+    total[i] = t
+
+
+@njit(EQUITY_CURVE_SIG, cache=True)
+def equity_curve_kernel(total, returns, equity, drawdown, stats):
+    """
+    Computes the returns, equity curve and drawdown of the per-bar
+    totals in a single pass. The first value of each is NaN.
+
+    The drawdown is the drop below a High Water Mark that starts
+    from zero, as in performance.create_drawdowns.
+
+    Parameters:
+    total - The per-bar portfolio totals.
+    returns, equity, drawdown - Output arrays, same size as total.
+    stats - Output [max drawdown, max drawdown duration], NaN if
+            there are fewer than two bars.
+    """
+    n = total.size
+    returns[0] = np.nan
+    equity[0] = np.nan
+    drawdown[0] = np.nan
+    if n < 2:
+        stats[0] = np.nan
+        stats[1] = np.nan
+        return
+
+    eq = 1.0
+    hwm = 0.0
+    max_dd = 0.0
+    cur_dur = 0.0
+    max_dur = 0.0
+    for i in range(1, n):
+        prev = total[i - 1]
+        if prev == 0.0:
+            # As numpy's x / 0: +-inf, or NaN when x is 0 or NaN
+            r = total[i] * np.inf - 1.0
+        else:
+            r = total[i] / prev - 1.0
+        eq *= 1.0 + r
+        returns[i] = r
+        equity[i] = eq
+        if eq > hwm:
+            hwm = eq
+        d = hwm - eq
+        drawdown[i] = d
+        cur_dur = 0.0 if d == 0 else cur_dur + 1.0
+        if d > max_dd:
+            max_dd = d
+        if cur_dur > max_dur:
+            max_dur = cur_dur
+    stats[0] = max_dd
+    stats[1] = max_dur
+
+
+if __name__ == "__main__":
+    # numba.pycc is only needed to build the extension
+    from numba.pycc import CC
+
+    cc = CC('_portfolio_kernels')
+    cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+    for name, sig in (('apply_fill', APPLY_FILL_SIG),
+                      ('apply_fills', APPLY_FILLS_SIG),
+                      ('update_timeindex_kernel', UPDATE_TIMEINDEX_SIG),
+                      ('equity_curve_kernel', EQUITY_CURVE_SIG)):
+        cc.export(name, sig)(globals()[name].py_func)
+    cc.compile()